@@ -3,9 +3,19 @@ A set of scripts to help calculate Factorio ratios.
 """
 
 import typing
-import collections.abc
+import array
 import itertools
 import json
+import sys
+
+# Parse json with orjson if it is installed, falling back to the standard
+# json module.
+_json_loads: typing.Callable[[str], typing.Any]
+try:
+  import orjson
+  _json_loads = orjson.loads
+except ImportError:
+  _json_loads = json.loads
 
 class Factory:
   """
@@ -16,8 +26,8 @@ class Factory:
 
   def __init__(self,
                final_products: set["Item"],
-               items: set["Item"],
-               recipes: set["Recipe"]) -> "Factory":
+               items: dict[str, "Item"],
+               recipes: dict[str, "Recipe"]) -> None:
     """
     Create a new Factory.
     """
@@ -26,65 +36,198 @@ class Factory:
     self._items = items
     self._recipes = recipes
 
+    self._output_to_recipe: dict[str, "Recipe"] = dict()
+    for recipe in recipes.values():
+      for line in recipe.get_outputs():
+        item_id = line.get_item().get_item_id()
+        if item_id in self._output_to_recipe:
+          raise Exception(f"There is more than one recipe with an output of {item_id}.")
+        self._output_to_recipe[item_id] = recipe
+
+    # Raw costs of every item, computed on the first call to get_raw_cost
+    # together with the index-based view of the recipes. Loading a Factory
+    # does not require its recipes to be acyclic.
+    self._raw_cost_cache: typing.Optional[list[dict[int, float]]] = None
+
+  def _index_recipes(self) -> None:
+    """
+    Builds a flat, index-based view of the items and recipes. Items are
+    numbered in topological order, so the raw materials take the indices
+    [0, _raw_count) and every item comes after the inputs of its recipe.
+    Recipes are numbered in the order their outputs first appear. The inputs
+    of all recipes are stored in the parallel arrays _in_idx and _in_qty, with
+    the inputs of recipe r found between _in_ptr[r] and _in_ptr[r + 1].
+    _recipe_of_output maps an item index to the index of the recipe producing
+    it (or -1 for raw materials), and _output_qty holds the quantity of the
+    item that recipe produces.
+    """
+
+    self._item_ids: list[str] = self._get_topological_order()
+    self._item_id_to_idx: dict[str, int] = {
+      item_id: item_idx for item_idx, item_id in enumerate(self._item_ids)
+    }
+    self._raw_count = sum(
+      1 for item_id in self._item_ids if item_id not in self._output_to_recipe
+    )
+
+    self._in_ptr: "array.array[int]" = array.array("i", [0])
+    self._in_idx: "array.array[int]" = array.array("i")
+    self._in_qty: "array.array[float]" = array.array("d")
+    self._recipe_of_output: "array.array[int]" = array.array("i", [-1]) * len(self._item_ids)
+    self._output_qty: "array.array[float]" = array.array("d", [0.0]) * len(self._item_ids)
+
+    recipe_count = 0
+    for item_idx in range(self._raw_count, len(self._item_ids)):
+      if self._recipe_of_output[item_idx] != -1:
+        # Already indexed through an earlier output of the same recipe.
+        continue
+
+      recipe = self._output_to_recipe[self._item_ids[item_idx]]
+      for line in recipe.get_inputs():
+        self._in_idx.append(self._item_id_to_idx[line.get_item().get_item_id()])
+        self._in_qty.append(line.get_quantity())
+      self._in_ptr.append(len(self._in_idx))
+
+      for line in recipe.get_outputs():
+        output_idx = self._item_id_to_idx[line.get_item().get_item_id()]
+        self._recipe_of_output[output_idx] = recipe_count
+        self._output_qty[output_idx] = line.get_quantity()
+      recipe_count += 1
+
+  def _get_topological_order(self) -> list[str]:
+    """
+    Gets the item ids ordered so that every item comes after all of the
+    inputs of the recipe producing it (Kahn's algorithm). Raw materials come
+    first, in insertion order. Throws an exception if the recipes contain a
+    cycle.
+    """
+
+    remaining_inputs: dict[str, int] = dict()
+    consumers: dict[str, list[str]] = {item_id: list() for item_id in self._items}
+    order: list[str] = list()
+    ready: list[str] = list()
+    for item_id in self._items:
+      recipe = self._output_to_recipe.get(item_id)
+      if recipe is None:
+        order.append(item_id)
+        continue
+
+      # Recipes cannot list the same item twice, so each input is counted once.
+      inputs = recipe.get_inputs()
+      remaining_inputs[item_id] = len(inputs)
+      if len(inputs) == 0:
+        ready.append(item_id)
+      for line in inputs:
+        consumers[line.get_item().get_item_id()].append(item_id)
+
+    order.extend(ready)
+    for item_id in order:
+      for consumer_id in consumers[item_id]:
+        remaining_inputs[consumer_id] -= 1
+        if remaining_inputs[consumer_id] == 0:
+          order.append(consumer_id)
+
+    if len(order) != len(self._items):
+      raise Exception("The recipes of the factory contain a cycle.")
+
+    return order
+
   @staticmethod
   def from_json_file(json_file: typing.TextIO) -> "Factory":
     """
-    Create a new Factory by loading the given json file.
+    Create a new Factory by loading the given json file. The file is read and
+    parsed in one go.
     """
 
-    json_dict = json.load(json_file)
+    json_dict: dict[str, typing.Any] = _json_loads(json_file.read())
 
     item_dicts = json_dict["items"]
     items: dict[str, "Item"] = dict()
     for item_dict in item_dicts:
       item = Item.from_dict(item_dict)
+      if item.get_item_id() in items:
+        raise Exception(f"An item with id {item.get_item_id()} has already been created.")
       items[item.get_item_id()] = item
 
     recipe_dicts = json_dict["recipes"]
     recipes: dict[str, "Recipe"] = dict()
     for recipe_dict in recipe_dicts:
-      recipe = Recipe.from_dict(recipe_dict)
+      recipe = Recipe.from_dict(recipe_dict, items)
+      if recipe.get_recipe_id() in recipes:
+        raise Exception(f"A recipe with id {recipe.get_recipe_id()} has already been created.")
       recipes[recipe.get_recipe_id()] = recipe
 
     final_product_ids = json_dict["final_products"]
     final_products: set["Item"] = set()
     for final_product_id in final_product_ids:
-      final_products.add(items[final_product_id])
+      final_products.add(items[sys.intern(final_product_id)])
 
     return Factory(final_products, items, recipes)
   
-  def get_raw_cost(self, item_id: str) -> set["RecipeLine"]:
+  def get_raw_cost(self, item_id: str) -> dict[str, float]:
     """
     Get the raw cost of the item with the given id in terms of raw materials
-    (items which do not have recipes).
+    (items which do not have recipes). The cost is returned as a dict from the
+    id of each raw material to the quantity of it needed.
+    """
+
+    if self._raw_cost_cache is None:
+      self._index_recipes()
+      self._raw_cost_cache = self._compute_raw_costs()
+
+    raw_cost = self._raw_cost_cache[self._item_id_to_idx[item_id]]
+    return {
+      self._item_ids[raw_idx]: quantity
+      for raw_idx, quantity in raw_cost.items()
+    }
+
+  def _compute_raw_costs(self) -> list[dict[int, float]]:
+    """
+    Computes the raw cost of one unit of every item, indexed by item index.
+    Each raw cost maps the index of a raw material to the quantity needed, and
+    only holds the raw materials the item actually uses.
+
+    The costs satisfy X = A X + B, where A holds the quantity of each input
+    per unit of output and B selects the raw materials. Items are numbered in
+    topological order, so A is strictly lower triangular and the system is
+    solved for every item at once by forward substitution: each cost is the
+    sum of its inputs' costs, which have already been computed.
     """
 
-    if not self._is_recipe_with_output(item_id):
-      return {
-        RecipeLine()
-      }
+    raw_costs: list[dict[int, float]] = [
+      {raw_idx: 1.0} for raw_idx in range(self._raw_count)
+    ]
+    raw_costs.extend(dict() for _ in range(self._raw_count, len(self._item_ids)))
 
-    raw_cost: set[RecipeLine] = set()
+    for item_idx in range(self._raw_count, len(self._item_ids)):
+      recipe_idx = self._recipe_of_output[item_idx]
 
-    # Find the recipe used to craft the item
-    recipe = self._get_recipe_with_output(item_id)
+      raw_cost = raw_costs[item_idx]
+      divider = self._output_qty[item_idx]
+      for line_idx in range(self._in_ptr[recipe_idx], self._in_ptr[recipe_idx + 1]):
+        multiplier = self._in_qty[line_idx] / divider
+        for raw_idx, quantity in raw_costs[self._in_idx[line_idx]].items():
+          raw_cost[raw_idx] = raw_cost.get(raw_idx, 0.0) + multiplier * quantity
 
-    divider = recipe.get_output_quantity(item_id)
-    for input_id in recipe.
+    return raw_costs
 
+  def _is_recipe_with_output(self, item_id: str) -> bool:
+    """
+    Gets whether there is a recipe with the given output.
+    """
+    return item_id in self._output_to_recipe
 
   def _get_recipe_with_output(self, item_id: str) -> "Recipe":
     """
-    Gets the recipe with the given output. If there are multiple such recipes,
-    throws an exception.
+    Gets the recipe with the given output. If there is no such recipe, throws
+    an exception. (Multiple recipes with the same output are rejected when the
+    Factory is created.)
     """
 
-    recipes_with_output = set(filter(self._recipes, lambda r: r.is_output(item_id)))
-    if len(recipes_with_output) == 1:
-      recipe_with_output = recipes_with_output.pop()
-      return recipes_with_output
-    
-    raise Exception(f"There is no recipe with an output of {item_id}.")
+    try:
+      return self._output_to_recipe[item_id]
+    except KeyError:
+      raise Exception(f"There is no recipe with an output of {item_id}.") from None
 
 
 class Item:
@@ -92,23 +235,18 @@ class Item:
   Represents an item that can be produced and consumed by Recipes.
   """
 
-  _used_item_ids: set[str] = set()
+  __slots__ = ("_item_id", "_item_name", "_hash")
 
-  def __init__(self, item_id: str, item_name: str) -> "Item":
+  def __init__(self, item_id: str, item_name: str) -> None:
     """
     Create a new Item with the given id and name. For Items, the id is
-    considered the source of identity, so the id is returned as the hash.
-    New items cannot be created if the id is already taken. If a call attempts
-    to create such an item, an exception is raised.
+    considered the source of identity, so the id is returned as the hash. The
+    id is interned, so comparisons between equal ids are identity checks.
     """
 
-    if item_id in Item._used_item_ids:
-      raise Exception(f"An item with id {item_id} has already been created.")
-    
-    self._item_id = item_id
+    self._item_id = sys.intern(item_id)
     self._item_name = item_name
-
-    Item._used_item_ids.add(item_id)
+    self._hash = hash(self._item_id)
 
   @staticmethod
   def from_dict(item_dict: dict[str, typing.Any]) -> "Item":
@@ -118,9 +256,11 @@ class Item:
     return Item(item_dict["item_id"], item_dict["item_name"])
 
   def __hash__(self) -> int:
-    return hash(self.get_item_id())
+    return self._hash
   
-  def __eq__(self, other) -> bool:
+  def __eq__(self, other: object) -> bool:
+    if self is other:
+      return True
     if not isinstance(other, Item):
       return False
     return self.get_item_id() == other.get_item_id()
@@ -137,44 +277,42 @@ class Recipe:
   other Items.
   """
 
-  _used_recipe_ids: set[str] = set()
+  __slots__ = ("_recipe_id", "_recipe_name", "_inputs", "_outputs", "_hash")
 
   def __init__(self,
                recipe_id: str,
                recipe_name: str,
                inputs: typing.Iterable["RecipeLine"], 
-               outputs: typing.Iterable["RecipeLine"]) -> "Recipe":
+               outputs: typing.Iterable["RecipeLine"]) -> None:
     """
     Create a new Recipe from the given sets of input RecipeLines and output
     RecipeLines.
     """
 
-    if recipe_id in Recipe._used_recipe_ids:
-      raise Exception(f"A recipe with id {recipe_id} has already been created.")
-
-    self._recipe_id = recipe_id
+    self._recipe_id = sys.intern(recipe_id)
     self._recipe_name = recipe_name
+    self._hash = hash(self._recipe_id)
 
-    self._inputs: dict[str, "RecipeLine"] = Recipe._build_dict(inputs)
-    self._outputs: dict[str, "RecipeLine"] = Recipe._build_dict(outputs)
-
-    Recipe._used_recipe_ids.add(recipe_id)
+    self._inputs: tuple["RecipeLine", ...] = Recipe._build_lines(inputs)
+    self._outputs: tuple["RecipeLine", ...] = Recipe._build_lines(outputs)
 
   @staticmethod
-  def from_dict(recipe_dict: dict[str, typing.Any]) -> "Recipe":
+  def from_dict(recipe_dict: dict[str, typing.Any],
+                items: dict[str, Item]) -> "Recipe":
     """
-    Create a new Recipe from the parameters in the given dict.
+    Create a new Recipe from the parameters in the given dict. Item ids in the
+    dict are resolved using the given dict of Items.
     """
 
     input_dicts = recipe_dict["inputs"]
-    inputs: set["RecipeLine"] = set()
+    inputs: list["RecipeLine"] = list()
     for input_dict in input_dicts:
-      inputs.add(RecipeLine.from_dict(input_dict))
+      inputs.append(RecipeLine.from_dict(input_dict, items))
 
     output_dicts = recipe_dict["outputs"]
-    outputs: set["RecipeLine"] = set()
+    outputs: list["RecipeLine"] = list()
     for output_dict in output_dicts:
-      outputs.add(RecipeLine.from_dict(output_dict))
+      outputs.append(RecipeLine.from_dict(output_dict, items))
 
     return Recipe(
       recipe_dict["recipe_id"],
@@ -184,9 +322,11 @@ class Recipe:
     )
   
   def __hash__(self) -> int:
-    return hash(self.get_recipe_id())
+    return self._hash
   
-  def __eq__(self, other) -> bool:
+  def __eq__(self, other: object) -> bool:
+    if self is other:
+      return True
     if not isinstance(other, Recipe):
       return False
     return self.get_recipe_id() == other.get_recipe_id()
@@ -197,13 +337,13 @@ class Recipe:
   def get_recipe_name(self) -> str:
     return self._recipe_name
 
-  def get_inputs(self) -> set["RecipeLine"]:
+  def get_inputs(self) -> tuple["RecipeLine", ...]:
     """
     Get the inputs of the Recipe.
     """
     return self._inputs
 
-  def get_outputs(self) -> set["RecipeLine"]:
+  def get_outputs(self) -> tuple["RecipeLine", ...]:
     """
     Get the outputs of the Recipe.
     """
@@ -213,37 +353,40 @@ class Recipe:
     """
     Gets whether the given item id is among the outputs of the recipe.
     """
-    return item_id in self._outputs.keys()
+    return Recipe._find_line(self._outputs, item_id) is not None
   
   def is_input(self, item_id: str) -> bool:
     """
     Gets whether the given item_id is among the inputs of the recipe.
     """
-    return item_id in self._inputs.keys()
+    return Recipe._find_line(self._inputs, item_id) is not None
   
   def get_output_quantity(self, item_id: str) -> float:
     """
     Gets the quantity of the given item that the recipe outputs.
     """
-    if self.is_output(item_id):
-      return self._get_output_line(item_id).get_quantity()
-    return 0
+    line = Recipe._find_line(self._outputs, item_id)
+    if line is None:
+      return 0.0
+    return line.get_quantity()
 
   def get_input_quantity(self, item_id: str) -> float:
     """
     Gets the quantity of the given item that the recipe inputs.
     """
-    if self.is_input(item_id):
-      return self._get_input_line(item_id).get_quantity()
-    return 0
+    line = Recipe._find_line(self._inputs, item_id)
+    if line is None:
+      return 0.0
+    return line.get_quantity()
 
   def _get_input_line(self, item_id: str) -> "RecipeLine":
     """
     Gets the input line corresponding to the given item_id. Throws an exception
     if there is no such line.
     """
-    if self.is_input(item_id):
-      return self._inputs[item_id]
+    line = Recipe._find_line(self._inputs, item_id)
+    if line is not None:
+      return line
     raise Exception(f"Recipe does not include {item_id} as an input.")
 
   def _get_output_line(self, item_id: str) -> "RecipeLine":
@@ -251,24 +394,38 @@ class Recipe:
     Gets the output line corresponding to the given item_id. Throws an exception
     if there is no such line.
     """
-    if self.is_output(item_id):
-      return self._outputs[item_id]
+    line = Recipe._find_line(self._outputs, item_id)
+    if line is not None:
+      return line
     raise Exception(f"Recipe does not include {item_id} as an output.")
 
   @staticmethod
-  def _build_dict(lines: typing.Iterable["RecipeLine"]) -> dict[str, "RecipeLine"]:
+  def _find_line(lines: tuple["RecipeLine", ...],
+                 item_id: str) -> typing.Optional["RecipeLine"]:
     """
-    Builds a dictionary from the given iterable of RecipeLines, with the
-    item_id as the key and the RecipeLine as the value.
+    Finds the line for the given item_id, or None if there is no such line.
+    Recipes only have a handful of lines, so a linear scan is used.
     """
-    line_dict: dict[str, "RecipeLine"] = dict()
     for line in lines:
+      if line.get_item().get_item_id() == item_id:
+        return line
+    return None
+
+  @staticmethod
+  def _build_lines(lines: typing.Iterable["RecipeLine"]) -> tuple["RecipeLine", ...]:
+    """
+    Builds a tuple from the given iterable of RecipeLines, checking that no
+    two lines represent the same item.
+    """
+    line_tuple = tuple(lines)
+    item_ids: set[str] = set()
+    for line in line_tuple:
       item_id = line.get_item().get_item_id()
-      if item_id in line_dict.keys():
+      if item_id in item_ids:
         raise Exception(f"Recipe cannot have more than one input or output line representing the same item: {item_id}.")
-      line_dict[item_id] = line
+      item_ids.add(item_id)
 
-    return line_dict
+    return line_tuple
 
 class RecipeLine:
   """
@@ -276,7 +433,9 @@ class RecipeLine:
   with a Quantity.
   """
 
-  def __init__(self, item: Item, quantity: float) -> "RecipeLine":
+  __slots__ = ("_item", "_quantity")
+
+  def __init__(self, item: Item, quantity: float) -> None:
     """
     Create a new RecipeLine with the given Item and quantity.
     """
@@ -285,12 +444,14 @@ class RecipeLine:
     self._quantity = float(quantity)
 
   @staticmethod
-  def from_dict(line_dict: dict[str, typing.Any]) -> "RecipeLine":
+  def from_dict(line_dict: dict[str, typing.Any],
+                items: dict[str, Item]) -> "RecipeLine":
     """
-    Create a new RecipeLine from the parameters in the given dict.
+    Create a new RecipeLine from the parameters in the given dict. The item id
+    in the dict is resolved using the given dict of Items.
     """
 
-    return RecipeLine(line_dict["item"], line_dict["quantity"])
+    return RecipeLine(items[sys.intern(line_dict["item"])], line_dict["quantity"])
 
   def get_item(self) -> Item:
     return self._item
@@ -298,7 +459,7 @@ class RecipeLine:
   def get_quantity(self) -> float:
     return self._quantity
   
-def main():
+def main() -> None:
   
   with open("simple.json", "r") as json_file:
     factory = Factory.from_json_file(json_file)
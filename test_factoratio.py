@@ -0,0 +1,137 @@
+"""
+Tests for factoratio.
+"""
+
+import io
+import json
+import os
+import sys
+import unittest
+
+from factoratio import Factory, Item, Recipe, RecipeLine
+
+SIMPLE_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simple.json")
+
+def load_simple() -> Factory:
+  with open(SIMPLE_JSON, "r") as json_file:
+    return Factory.from_json_file(json_file)
+
+def make_items(*item_ids: str) -> dict[str, Item]:
+  return {item_id: Item(item_id, item_id) for item_id in item_ids}
+
+def make_recipe(recipe_id: str,
+                inputs: list[tuple[Item, float]],
+                outputs: list[tuple[Item, float]]) -> Recipe:
+  return Recipe(
+    recipe_id,
+    recipe_id,
+    [RecipeLine(item, quantity) for item, quantity in inputs],
+    [RecipeLine(item, quantity) for item, quantity in outputs]
+  )
+
+def make_factory(items: dict[str, Item], *recipes: Recipe) -> Factory:
+  return Factory(set(), items, {recipe.get_recipe_id(): recipe for recipe in recipes})
+
+class TestSimpleJson(unittest.TestCase):
+
+  def test_raw_cost_of_intermediate_products(self) -> None:
+    factory = load_simple()
+    self.assertEqual(factory.get_raw_cost("circuit1"), {"copper": 1.5, "iron": 1.0})
+    self.assertEqual(factory.get_raw_cost("cable"), {"copper": 0.5})
+    self.assertEqual(factory.get_raw_cost("gear"), {"iron": 2.0})
+
+  def test_raw_cost_of_raw_material(self) -> None:
+    factory = load_simple()
+    self.assertEqual(factory.get_raw_cost("iron"), {"iron": 1.0})
+
+  def test_same_file_loads_twice(self) -> None:
+    first = load_simple()
+    second = load_simple()
+    self.assertEqual(first.get_raw_cost("circuit1"), second.get_raw_cost("circuit1"))
+
+  def test_duplicate_item_id_is_rejected(self) -> None:
+    with open(SIMPLE_JSON, "r") as json_file:
+      json_dict = json.load(json_file)
+    json_dict["items"].append({"item_id": "iron", "item_name": "Iron Plate"})
+    with self.assertRaises(Exception):
+      Factory.from_json_file(io.StringIO(json.dumps(json_dict)))
+
+  def test_duplicate_recipe_id_is_rejected(self) -> None:
+    with open(SIMPLE_JSON, "r") as json_file:
+      json_dict = json.load(json_file)
+    json_dict["recipes"].append(json_dict["recipes"][0])
+    with self.assertRaises(Exception):
+      Factory.from_json_file(io.StringIO(json.dumps(json_dict)))
+
+class TestRawCost(unittest.TestCase):
+
+  def test_recipe_with_several_outputs(self) -> None:
+    items = make_items("oil", "petroleum", "gas", "plastic")
+    factory = make_factory(
+      items,
+      make_recipe("cracking", [(items["oil"], 10)], [(items["petroleum"], 4), (items["gas"], 2)]),
+      make_recipe("plastic", [(items["petroleum"], 2), (items["gas"], 1)], [(items["plastic"], 1)])
+    )
+    self.assertEqual(factory.get_raw_cost("petroleum"), {"oil": 2.5})
+    self.assertEqual(factory.get_raw_cost("gas"), {"oil": 5.0})
+    self.assertEqual(factory.get_raw_cost("plastic"), {"oil": 10.0})
+
+  def test_recipe_with_no_inputs(self) -> None:
+    items = make_items("water", "steam")
+    factory = make_factory(
+      items,
+      make_recipe("pump", [], [(items["water"], 100)]),
+      make_recipe("boil", [(items["water"], 1)], [(items["steam"], 1)])
+    )
+    self.assertEqual(factory.get_raw_cost("water"), {})
+    self.assertEqual(factory.get_raw_cost("steam"), {})
+
+  def test_deep_chain_beyond_recursion_limit(self) -> None:
+    depth = sys.getrecursionlimit() * 2
+    items = make_items(*(f"item{i}" for i in range(depth)))
+    recipes = [
+      make_recipe(f"recipe{i}", [(items[f"item{i - 1}"], 2)], [(items[f"item{i}"], 2)])
+      for i in range(1, depth)
+    ]
+    factory = make_factory(items, *recipes)
+    self.assertEqual(factory.get_raw_cost(f"item{depth - 1}"), {"item0": 1.0})
+
+  def test_cycle_loads_but_has_no_raw_cost(self) -> None:
+    items = make_items("u")
+    factory = make_factory(items, make_recipe("double", [(items["u"], 1)], [(items["u"], 2)]))
+    with self.assertRaises(Exception):
+      factory.get_raw_cost("u")
+
+  def test_duplicate_output_is_rejected(self) -> None:
+    items = make_items("iron", "gear")
+    with self.assertRaises(Exception):
+      make_factory(
+        items,
+        make_recipe("gear", [(items["iron"], 2)], [(items["gear"], 1)]),
+        make_recipe("cheap-gear", [(items["iron"], 1)], [(items["gear"], 1)])
+      )
+
+  def test_duplicate_line_is_rejected(self) -> None:
+    items = make_items("iron", "gear")
+    with self.assertRaises(Exception):
+      make_recipe("gear", [(items["iron"], 1), (items["iron"], 1)], [(items["gear"], 1)])
+
+class TestRecipe(unittest.TestCase):
+
+  def test_quantities(self) -> None:
+    factory = load_simple()
+    recipe = factory._get_recipe_with_output("cable")
+    self.assertEqual(recipe.get_output_quantity("cable"), 2.0)
+    self.assertEqual(recipe.get_input_quantity("copper"), 1.0)
+    self.assertEqual(recipe.get_input_quantity("iron"), 0.0)
+    self.assertTrue(recipe.is_input("copper"))
+    self.assertFalse(recipe.is_output("copper"))
+
+  def test_missing_recipe(self) -> None:
+    factory = load_simple()
+    self.assertFalse(factory._is_recipe_with_output("iron"))
+    with self.assertRaises(Exception):
+      factory._get_recipe_with_output("iron")
+
+if __name__ == "__main__":
+  unittest.main()